@@ -0,0 +1,333 @@
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from typing import Dict, Optional
+
+from result_types import AnalysisResult, EmotionScore
+
+logger = logging.getLogger(__name__)
+
+
+class BackendStats:
+    """Rolling latency and error statistics for a single analyzer backend."""
+
+    def __init__(self, window: int = 50):
+        self.latencies = deque(maxlen=window)  # seconds, one entry per finished call
+        self.outcomes = deque(maxlen=window)   # True for success, False for error
+        self.missed = deque(maxlen=window)     # True when the call was abandoned before finishing
+
+    def record(self, latency: float, success: bool, missed: bool = False):
+        self.latencies.append(latency)
+        self.outcomes.append(success)
+        self.missed.append(missed)
+
+    def record_miss(self, latency: float):
+        """Record a call abandoned before it finished: not an error, but never on time."""
+        self.record(latency, True, missed=True)
+
+    def reset(self):
+        self.latencies.clear()
+        self.outcomes.clear()
+        self.missed.clear()
+
+    @property
+    def samples(self) -> int:
+        return len(self.outcomes)
+
+    @property
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return 1.0 - sum(self.outcomes) / len(self.outcomes)
+
+    def probability_within(self, budget: float) -> float:
+        """Fraction of recent calls that succeeded within the budget (optimistic when empty)."""
+        if not self.outcomes:
+            return 1.0
+        hits = sum(
+            1 for latency, success, missed in zip(self.latencies, self.outcomes, self.missed)
+            if success and not missed and latency <= budget
+        )
+        return hits / len(self.outcomes)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(q * len(ordered)))
+        return ordered[index]
+
+
+class CircuitBreaker:
+    """Sheds a degraded backend after repeated failures and probes it again after a cooldown."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        error_rate_threshold: float = 0.5,
+        min_samples: int = 10,
+        cooldown: float = 30.0,
+    ):
+        self.failure_threshold = failure_threshold
+        self.error_rate_threshold = error_rate_threshold
+        self.min_samples = min_samples
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+
+    def current_state(self) -> str:
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+            self.state = self.HALF_OPEN
+            self.probe_in_flight = False
+        return self.state
+
+    def allow_request(self) -> bool:
+        state = self.current_state()
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self.probe_in_flight:
+            self.probe_in_flight = True
+            return True
+        return False
+
+    def record_success(self) -> bool:
+        """Record a success; returns True when this closes a half-open breaker."""
+        recovered = self.state == self.HALF_OPEN
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.probe_in_flight = False
+        return recovered
+
+    def record_failure(self, stats: BackendStats):
+        self.consecutive_failures += 1
+        self.probe_in_flight = False
+        too_many_failures = self.consecutive_failures >= self.failure_threshold
+        too_error_prone = (
+            stats.samples >= self.min_samples
+            and stats.error_rate >= self.error_rate_threshold
+        )
+        if self.state == self.HALF_OPEN or too_many_failures or too_error_prone:
+            if self.state != self.OPEN:
+                logger.warning(f"Circuit breaker opened after {self.consecutive_failures} consecutive failures")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+
+class HybridAnalyzerRouter:
+    """
+    Keeps the Gemini and local analyzers live and picks one per request.
+
+    Each request goes to the backend most likely to answer within its latency
+    budget, based on rolling stats. Gemini calls are hedged with the local model
+    once they run past the hedge delay, and a circuit breaker sheds Gemini while
+    it is failing.
+    """
+
+    def __init__(
+        self,
+        ai_analyzer=None,
+        local_analyzer=None,
+        default_budget_ms: int = 3000,
+        min_success_probability: float = 0.8,
+        explore_rate: float = 0.05,
+        window: int = 50,
+        max_concurrent_hedges: int = 2,
+    ):
+        if ai_analyzer is None and local_analyzer is None:
+            raise ValueError("HybridAnalyzerRouter needs at least one analyzer backend")
+
+        self.ai_analyzer = ai_analyzer
+        self.local_analyzer = local_analyzer
+        self.default_budget_ms = default_budget_ms
+        self.min_success_probability = min_success_probability
+        self.explore_rate = explore_rate
+        self.max_concurrent_hedges = max_concurrent_hedges
+        self.stats = {"gemini": BackendStats(window), "local": BackendStats(window)}
+        self.breaker = CircuitBreaker()
+        self._hedge_tasks = set()  # local hedges still running, including ones that lost
+
+    @property
+    def backends(self):
+        names = []
+        if self.ai_analyzer is not None:
+            names.append("gemini")
+        if self.local_analyzer is not None:
+            names.append("local")
+        return names
+
+    async def analyze_journal(self, text: str, latency_budget_ms: Optional[int] = None) -> AnalysisResult:
+        """Analyze a journal entry with whichever backend best fits the latency budget."""
+        result = await self._route(text, latency_budget_ms)
+        if isinstance(result, AnalysisResult):
+            return result
+        return AnalysisResult.from_dict(result)
+
+    async def _route(self, text: str, latency_budget_ms: Optional[int]):
+        budget = (latency_budget_ms or self.default_budget_ms) / 1000.0
+
+        if self.ai_analyzer is None:
+            return await self._call_local(text)
+
+        if self.local_analyzer is None:
+            if not self.breaker.allow_request():
+                logger.info("Gemini circuit open and no local analyzer, returning neutral response")
+                return self._neutral_response(text)
+            try:
+                return await self._call_gemini(text, budget)
+            except Exception as e:
+                logger.error(f"Gemini analysis failed: {str(e)}")
+                return self._neutral_response(text)
+
+        if self._prefer_gemini(budget) and self.breaker.allow_request():
+            return await self._hedged(text, budget)
+
+        logger.info("Routing journal analysis to local analyzer")
+        return await self._call_local(text)
+
+    def _prefer_gemini(self, budget: float) -> bool:
+        state = self.breaker.current_state()
+        if state == CircuitBreaker.OPEN:
+            return False
+        if state == CircuitBreaker.HALF_OPEN:
+            return True  # send the probe; the hedge bounds its cost
+
+        p_gemini = self.stats["gemini"].probability_within(budget)
+        p_local = self.stats["local"].probability_within(budget)
+        if p_gemini >= self.min_success_probability or p_gemini >= p_local:
+            return True
+        # Occasionally sample Gemini anyway so stale stats can recover
+        return random.random() < self.explore_rate
+
+    def _hedge_delay(self, budget: float) -> Optional[float]:
+        """
+        Start the local hedge early enough that it can still finish within the budget.
+        Returns None when hedging would not help.
+        """
+        gemini_p95 = None
+        if self.stats["gemini"].samples >= 10:
+            gemini_p95 = self.stats["gemini"].quantile(0.95)
+
+        local_p95 = self.stats["local"].quantile(0.95)
+        if local_p95 is None:
+            delay = budget / 2
+        elif local_p95 < budget:
+            delay = budget - local_p95
+        else:
+            # The local model cannot meet the budget either, so only hedge Gemini's slow tail
+            return gemini_p95
+
+        if gemini_p95 is not None:
+            # Gemini is usually faster than that, so only hedge its slow tail
+            delay = min(delay, gemini_p95)
+        return delay
+
+    async def _hedged(self, text: str, budget: float) -> Dict:
+        """Run Gemini and start the local model if Gemini has not answered by the hedge delay."""
+        gemini_task = asyncio.ensure_future(self._call_gemini(text, budget))
+        await asyncio.wait({gemini_task}, timeout=self._hedge_delay(budget))
+
+        if not gemini_task.done() and len(self._hedge_tasks) >= self.max_concurrent_hedges:
+            # Every hedge holds a worker thread until it finishes; don't queue more behind them
+            logger.info("Too many local hedges running, waiting for Gemini")
+            await asyncio.wait({gemini_task})
+
+        if gemini_task.done() and not gemini_task.exception():
+            return gemini_task.result()
+
+        if gemini_task.done():
+            logger.warning(f"Gemini analysis failed, using local analyzer: {gemini_task.exception()}")
+            try:
+                return await self._call_local(text)
+            except Exception as e:
+                logger.error(f"Local analysis failed: {str(e)}")
+                return self._neutral_response(text)
+
+        logger.info("Gemini is slow, hedging with local analyzer")
+        local_task = asyncio.ensure_future(self._call_local(text))
+        # The local model runs in a thread and cannot be interrupted; if it loses it
+        # finishes in the background, so keep a reference until then and count it
+        # against max_concurrent_hedges.
+        self._hedge_tasks.add(local_task)
+        local_task.add_done_callback(self._hedge_tasks.discard)
+        pending = {gemini_task, local_task}
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception():
+                    continue
+                if task is local_task:
+                    gemini_task.cancel()
+                return task.result()
+
+        logger.error("Both analyzers failed, returning neutral response")
+        return self._neutral_response(text)
+
+    async def _call_gemini(self, text: str, budget: float) -> Dict:
+        stats = self.stats["gemini"]
+        start = time.perf_counter()
+        try:
+            result = await self.ai_analyzer.analyze_journal_strict(text)
+        except asyncio.CancelledError:
+            # Lost the hedge: count it as a budget miss, not as an error
+            stats.record_miss(max(time.perf_counter() - start, budget))
+            self.breaker.probe_in_flight = False
+            raise
+        except Exception:
+            stats.record(time.perf_counter() - start, False)
+            self.breaker.record_failure(stats)
+            raise
+
+        stats.record(time.perf_counter() - start, True)
+        if self.breaker.record_success():
+            logger.info("Gemini recovered, circuit breaker closed")
+            stats.reset()
+            stats.record(time.perf_counter() - start, True)
+        return result
+
+    async def _call_local(self, text: str) -> Dict:
+        stats = self.stats["local"]
+        start = time.perf_counter()
+        try:
+            # The local pipelines are CPU-bound, so keep them off the event loop
+            result = await asyncio.to_thread(asyncio.run, self.local_analyzer.analyze_journal(text))
+        except Exception:
+            stats.record(time.perf_counter() - start, False)
+            raise
+        stats.record(time.perf_counter() - start, True)
+        return result
+
+    def _neutral_response(self, text: str) -> AnalysisResult:
+        return AnalysisResult(
+            refined=text,
+            summary="Your emotions appear balanced and neutral.",
+            emotions=[EmotionScore("neutral", 1.0)],
+            intensity=5,
+            dominant_emotion="neutral",
+            wellness_suggestions=[],
+            exercises=[],
+        )
+
+    def snapshot(self) -> Dict:
+        """Current routing state for health reporting."""
+        report = {}
+        for name in self.backends:
+            stats = self.stats[name]
+            p50 = stats.quantile(0.5)
+            p95 = stats.quantile(0.95)
+            report[name] = {
+                "samples": stats.samples,
+                "error_rate": round(stats.error_rate, 3),
+                "p50_ms": round(p50 * 1000) if p50 is not None else None,
+                "p95_ms": round(p95 * 1000) if p95 is not None else None,
+            }
+        if "gemini" in report:
+            report["gemini"]["circuit"] = self.breaker.current_state()
+        return report
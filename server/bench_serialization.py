@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Compare per-request serialization cost of the old dict -> Pydantic -> JSON
+path with the slot-based records rendered by orjson.
+
+Usage: python bench_serialization.py [iterations]
+"""
+
+import json
+import sys
+import timeit
+import tracemalloc
+
+from typing import Any, Dict, List, Optional
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+
+from recommendations import Recommender
+from result_types import AnalysisResult, ChatReply, dumps
+
+RAW_ANALYSIS = {
+    "refined": "Today was long. I missed my family and felt tired after work, but the walk home helped a little.",
+    "summary": "It sounds like you're carrying some loneliness and fatigue, with a small moment of relief.",
+    "emotions": [
+        {"label": "sadness", "score": 0.52},
+        {"label": "fear", "score": 0.21},
+        {"label": "calm", "score": 0.17},
+        {"label": "joy", "score": 0.10},
+    ],
+    "intensity": 6,
+    "dominant_emotion": "sadness",
+}
+
+RAW_CHAT = {
+    "message": "That sounds really heavy. Would a short breathing exercise help you unwind tonight?",
+    "suggests_exercise": True,
+    "timestamp": None,
+    "exercise": {"type": "breathing", "title": "Deep Breathing", "duration": "5 min"},
+}
+
+# Same shapes as the response models in main.py (imported here without loading the analyzers)
+class EmotionResponse(BaseModel):
+    refined: str
+    summary: str
+    emotions: List[Dict[str, Any]]
+    intensity: int
+    dominant_emotion: str
+    wellness_suggestions: List[str] = []
+    exercises: List[Dict[str, Any]] = []
+
+
+class ChatResponse(BaseModel):
+    message: str
+    suggests_exercise: bool
+    timestamp: Optional[str] = None
+    exercise: Optional[Dict[str, Any]] = None
+
+
+recommender = Recommender()
+recommender.warm()
+recommendations = recommender.recommend("sadness", 6)
+
+
+def render_default(content) -> bytes:
+    """What FastAPI's default JSONResponse does with a validated response model."""
+    return json.dumps(
+        jsonable_encoder(content), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def analysis_old() -> bytes:
+    response = EmotionResponse(
+        **RAW_ANALYSIS,
+        wellness_suggestions=recommendations["tips"],
+        exercises=recommendations["exercises"],
+    )
+    return render_default(response)
+
+
+def analysis_new() -> bytes:
+    result = AnalysisResult.from_dict(RAW_ANALYSIS)
+    result.wellness_suggestions = recommendations["tips"]
+    result.exercises = recommendations["exercises"]
+    return dumps(result)
+
+
+def chat_old() -> bytes:
+    return render_default(ChatResponse(**RAW_CHAT))
+
+
+def chat_new() -> bytes:
+    return dumps(ChatReply(**RAW_CHAT))
+
+
+def allocations(fn, runs: int = 1000):
+    """Average peak traced memory (bytes) per call, including freed temporaries."""
+    fn()
+    tracemalloc.start()
+    total = 0
+    for _ in range(runs):
+        tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+        total += peak - baseline
+    tracemalloc.stop()
+    return total / runs
+
+
+def report(name: str, old, new, iterations: int):
+    assert json.loads(old()) == json.loads(new()), f"{name}: outputs differ"
+    old_us = min(timeit.repeat(old, number=iterations, repeat=5)) / iterations * 1e6
+    new_us = min(timeit.repeat(new, number=iterations, repeat=5)) / iterations * 1e6
+    old_bytes = allocations(old)
+    new_bytes = allocations(new)
+    print(f"{name}")
+    print(f"  time/request    old {old_us:8.2f} us   new {new_us:8.2f} us   ({old_us / new_us:.1f}x)")
+    print(f"  peak mem/call   old {old_bytes:8.0f} B    new {new_bytes:8.0f} B    ({old_bytes / new_bytes:.1f}x)")
+
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    report("/analyze_journal", analysis_old, analysis_new, iterations)
+    report("/chat", chat_old, chat_new, iterations)
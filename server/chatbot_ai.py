@@ -1,16 +1,36 @@
 import os
 import json
+import asyncio
 import logging
+from collections import OrderedDict
 from typing import Dict, List, Optional
 from dotenv import load_dotenv
 import google.generativeai as genai
+from user_context import fit_to_token_budget
+from result_types import ChatReply
+from session_store import InMemorySessionStore, SessionStore
 
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+EXERCISE_KEYWORDS = ('breathing', 'exercise', 'meditation', 'practice', 'try', 'mindfulness')
+
+DEFAULT_SESSION = "default"
+
+def resolve_session_id(session_id: Optional[str] = None, user_id: Optional[str] = None) -> str:
+    """Pick the conversation a request belongs to: explicit session, then user, then the shared default."""
+    return session_id or user_id or DEFAULT_SESSION
+
 class MentalHealthChatbot:
-    def __init__(self):
+    def __init__(
+        self,
+        context_token_budget: int = 120,
+        session_store: Optional[SessionStore] = None,
+        history_turns: int = 20,
+        compact_every: int = 10,
+        max_cached_sessions: int = 1000
+    ):
         """Initialize the mental health chatbot with Google Gemini."""
         api_key = os.getenv("GEMINI_API_KEY")
         if not api_key:
@@ -18,14 +38,25 @@ class MentalHealthChatbot:
         
         genai.configure(api_key=api_key)
         
+        # Upper bound on the context prepended to each message, in estimated tokens
+        self.context_token_budget = context_token_budget
+        
         # Use gemini-2.0-flash-lite for fast, efficient conversations
         self.model = genai.GenerativeModel(
             'gemini-2.0-flash-lite',
             system_instruction=self._get_system_instruction()
         )
         
-        # Start a chat session
-        self.chat = self.model.start_chat(history=[])
+        # Conversations live in the session store; each worker keeps recently
+        # used histories cached and hydrates others on demand
+        self.session_store = session_store or InMemorySessionStore()
+        # Trim in whole user/model exchanges so history always starts with a user turn
+        self.history_turns = max(2, history_turns - history_turns % 2)
+        if self.history_turns != history_turns:
+            logger.warning(f"history_turns must be an even number >= 2, using {self.history_turns}")
+        self.compact_every = compact_every
+        self.max_cached_sessions = max_cached_sessions
+        self._sessions: "OrderedDict[str, Dict]" = OrderedDict()
         
         logger.info("Mental Health Chatbot initialized with Gemini 2.0 Flash Lite")
     
@@ -63,30 +94,38 @@ Remember: You're a supportive companion, not a therapist."""
     async def send_message(
         self,
         message: str,
-        user_context: Optional[Dict] = None
-    ) -> Dict:
+        user_context: Optional[Dict] = None,
+        context_summary: Optional[str] = None,
+        session_id: Optional[str] = None
+    ) -> ChatReply:
         """
         Send a message to the chatbot and get a response.
         
         Args:
             message: User's message
             user_context: Optional context about user (recent emotions, journal entries, etc.)
+            context_summary: Optional pre-rendered server-side context; takes precedence over user_context
+            session_id: Conversation to continue; defaults to a single shared session
         
         Returns:
-            Dict with response and metadata
+            ChatReply with response and metadata
         """
         try:
             # Add context to the message if provided
             enhanced_message = message
-            if user_context:
-                context_info = self._format_context(user_context)
+            if context_summary or user_context:
+                context_info = context_summary or self._format_context(user_context)
                 if context_info:
                     enhanced_message = f"{context_info}\n\nUser says: {message}"
             
             logger.info(f"Sending message to chatbot: {message[:50]}...")
             
+            session_id = resolve_session_id(session_id)
+            session = await self._get_session(session_id)
+            chat = self.model.start_chat(history=list(session["history"]))
+            
             # Send message and get response
-            response = self.chat.send_message(
+            response = await chat.send_message_async(
                 enhanced_message,
                 generation_config=genai.types.GenerationConfig(
                     temperature=0.7,  # Balanced creativity and consistency
@@ -96,27 +135,30 @@ Remember: You're a supportive companion, not a therapist."""
             
             response_text = response.text.strip()
             
+            # Store the raw message, not the context-enhanced one, to keep history small
+            await self._append_turns(session_id, session, [("user", message), ("model", response_text)])
+            
             # Check if response suggests an exercise
-            suggests_exercise = any(
-                keyword in response_text.lower()
-                for keyword in ['breathing', 'exercise', 'meditation', 'practice', 'try', 'mindfulness']
-            )
+            response_lower = response_text.lower()
+            suggests_exercise = any(keyword in response_lower for keyword in EXERCISE_KEYWORDS)
             
             logger.info(f"Bot response: {response_text[:50]}...")
             
-            return {
-                "message": response_text,
-                "suggests_exercise": suggests_exercise,
-                "timestamp": None  # Will be set by frontend
-            }
+            return ChatReply(
+                message=response_text,
+                suggests_exercise=suggests_exercise,
+                timestamp=None,  # Will be set by frontend
+                exercise=None
+            )
         
         except Exception as e:
             logger.error(f"Error in chatbot: {str(e)}")
-            return {
-                "message": "I'm here to listen. Please tell me more about how you're feeling.",
-                "suggests_exercise": False,
-                "timestamp": None
-            }
+            return ChatReply(
+                message="I'm here to listen. Please tell me more about how you're feeling.",
+                suggests_exercise=False,
+                timestamp=None,
+                exercise=None
+            )
     
     def _format_context(self, context: Dict) -> str:
         """Format user context for the chatbot."""
@@ -137,24 +179,48 @@ Remember: You're a supportive companion, not a therapist."""
             summary = context["journal_summary"]
             context_parts.append(f"[Recent journal: {summary}]")
         
-        return " ".join(context_parts) if context_parts else ""
+        return fit_to_token_budget(context_parts, self.context_token_budget)
+    
+    async def _get_session(self, session_id: str) -> Dict:
+        """Return the cached session, re-hydrating it if another worker has written to it since."""
+        # Store calls block on disk or network, so run them off the event loop;
+        # the cache itself is only touched from the loop.
+        session = self._sessions.get(session_id)
+        if session is not None and session["seq"] == await asyncio.to_thread(self.session_store.last_seq, session_id):
+            self._sessions.move_to_end(session_id)
+            return session
+        
+        seq, turns = await asyncio.to_thread(self.session_store.load_turns, session_id, self.history_turns)
+        if turns and turns[0][0] != "user":
+            turns = turns[1:]  # a half exchange, e.g. left by concurrent writers
+        session = {
+            "seq": seq,
+            "history": [{"role": role, "parts": [text]} for role, text in turns]
+        }
+        self._sessions[session_id] = session
+        self._sessions.move_to_end(session_id)
+        if len(self._sessions) > self.max_cached_sessions:
+            self._sessions.popitem(last=False)
+        return session
     
-    def reset_conversation(self):
+    async def _append_turns(self, session_id: str, session: Dict, turns: List):
+        previous_seq, seq = await asyncio.to_thread(self.session_store.append_turns, session_id, turns)
+        
+        if previous_seq == session["seq"]:
+            session["history"].extend({"role": role, "parts": [text]} for role, text in turns)
+            del session["history"][:-self.history_turns]
+            session["seq"] = seq
+        else:
+            # Someone else wrote in between; re-hydrate on the next turn
+            self._sessions.pop(session_id, None)
+        
+        # Compact off the store-wide sequence so it still happens when workers take turns
+        if previous_seq // self.compact_every != seq // self.compact_every:
+            await asyncio.to_thread(self.session_store.compact, session_id, self.history_turns)
+    
+    async def reset_conversation(self, session_id: Optional[str] = None):
         """Reset the chat history to start fresh."""
-        self.chat = self.model.start_chat(history=[])
+        session_id = resolve_session_id(session_id)
+        await asyncio.to_thread(self.session_store.delete, session_id)
+        self._sessions.pop(session_id, None)
         logger.info("Chat conversation reset")
-    
-    def get_wellness_tip(self) -> str:
-        """Get a random wellness tip."""
-        tips = [
-            "Take three deep breaths before responding to any stressful situation. This simple pause can help you respond rather than react.",
-            "Practice the 5-4-3-2-1 grounding technique: Notice 5 things you see, 4 you can touch, 3 you hear, 2 you smell, and 1 you taste.",
-            "Set aside 5 minutes today for gratitude. Write down three things you're thankful for, no matter how small.",
-            "Movement is medicine. Even a 10-minute walk can boost your mood and clear your mind.",
-            "Your feelings are valid, and it's okay to not be okay. Reach out to someone you trust when you need support.",
-            "Quality sleep is crucial for mental health. Try to maintain a consistent sleep schedule.",
-            "Limit social media if it's affecting your mood. Take breaks and be mindful of your screen time.",
-            "Practice saying 'no' to protect your energy. Setting boundaries is an act of self-care.",
-        ]
-        import random
-        return random.choice(tips)
@@ -6,6 +6,8 @@ from transformers import pipeline, AutoTokenizer, AutoModelForSeq2SeqLM
 from typing import Dict, List
 import logging
 import re
+import time
+from generation_budget import GenerationBudget, GenerationSkipPredictor, GenerationStats
 
 logger = logging.getLogger(__name__)
 
@@ -15,6 +17,9 @@ class EmotionAnalyzer:
         self.text_refiner = None
         self.emotion_classifier = None
         self.conversational_model = None
+        self.generation_budget = GenerationBudget()
+        self.skip_predictor = GenerationSkipPredictor()
+        self.generation_stats = GenerationStats()
         self.initialize_models()
     
     def initialize_models(self):
@@ -112,7 +117,7 @@ class EmotionAnalyzer:
             summary = self.generate_empathetic_summary(emotion_labels, intensity, text)
             
             return {
-                "emotions": emotion_labels,
+                "emotions": [{"label": e['label'], "score": float(e['score'])} for e in top_emotions],
                 "intensity": intensity,
                 "summary": summary
             }
@@ -120,7 +125,7 @@ class EmotionAnalyzer:
         except Exception as e:
             logger.error(f"Error getting emotion summary: {str(e)}")
             return {
-                "emotions": ["neutral"],
+                "emotions": [{"label": "neutral", "score": 1.0}],
                 "intensity": 5,
                 "summary": "I sense a mix of emotions in your writing today."
             }
@@ -213,16 +218,21 @@ class EmotionAnalyzer:
                 Your heartfelt response:
                 """
             
-            # Generate with enhanced parameters for better emotional quality
+            # Skip generation when it is likely to be rejected by the checks below
+            prompt_type = "neutral" if primary_emotion == "neutral" else "emotional"
+            features = self.skip_predictor.features(prompt_type, emotions, intensity, original_text)
+            if self.skip_predictor.should_skip(features):
+                self.generation_stats.record_skip()
+                logger.info(f"Skipping generation, likely rejection for {primary_emotion} insight")
+                return self._generate_conversational_fallback_summary(emotions, intensity, original_text)
+            
+            # Generate within the token, sentence and time budget for this prompt type
+            start = time.perf_counter()
             result = self.conversational_model(
-                prompt, 
-                max_length=400, 
-                num_return_sequences=1, 
-                temperature=0.9,
-                top_p=0.95,
-                repetition_penalty=1.15,
-                do_sample=True
+                prompt,
+                **self.generation_budget.generate_kwargs(prompt_type, self.conversational_model.tokenizer)
             )
+            elapsed = time.perf_counter() - start
             summary = result[0]['generated_text'].strip()
             
             # Clean up the response thoroughly
@@ -249,7 +259,11 @@ class EmotionAnalyzer:
             formal_indicators = ['i am an ai', 'as an ai', 'i understand that', 'it appears that']
             too_formal = any(indicator in summary.lower() for indicator in formal_indicators)
             
-            if not summary or len(summary) < min_length or contains_inappropriate or too_formal:
+            rejected = not summary or len(summary) < min_length or contains_inappropriate or too_formal
+            self.generation_stats.record_generation(elapsed, rejected)
+            self.skip_predictor.update(features, rejected)
+            
+            if rejected:
                 logger.info(f"Using enhanced conversational fallback for {primary_emotion} emotional insight")
                 return self._generate_conversational_fallback_summary(emotions, intensity, original_text)
             
@@ -26,8 +26,23 @@ class AIEmotionAnalyzer:
         Fast single-step AI analysis: Break down emotions and score them in one call
         """
         try:
-            # Single optimized prompt that does both breakdown and analysis
-            prompt = f"""Analyze this journal entry for emotions. Respond in JSON format only.
+            return await self.analyze_journal_strict(text)
+        
+        except json.JSONDecodeError as e:
+            logger.error(f"JSON parsing error: {e}")
+            return self._get_neutral_response(text)
+        
+        except Exception as e:
+            logger.error(f"Error in AI emotion analysis: {str(e)}")
+            return self._get_neutral_response(text)
+    
+    async def analyze_journal_strict(self, text: str) -> Dict:
+        """
+        Same analysis as analyze_journal, but errors are raised instead of being
+        replaced by the neutral response, so callers can fall back or track failures.
+        """
+        # Single optimized prompt that does both breakdown and analysis
+        prompt = f"""Analyze this journal entry for emotions. Respond in JSON format only.
 
 Journal: "{text}"
 
@@ -47,56 +62,60 @@ Rules:
 - Only include emotions with score >= 0.15
 - Keep summary under 20 words"""
 
-            logger.info("Analyzing journal with AI (fast mode)...")
-            
-            # Generate with timeout
-            response = self.model.generate_content(
-                prompt,
-                generation_config=genai.types.GenerationConfig(
-                    temperature=0.3,  # Lower temperature for faster, more consistent results
-                    max_output_tokens=300,  # Limit output for speed
-                )
+        logger.info("Analyzing journal with AI (fast mode)...")
+        
+        # Async call so the router can hedge or cancel a slow request
+        response = await self.model.generate_content_async(
+            prompt,
+            generation_config=genai.types.GenerationConfig(
+                temperature=0.3,  # Lower temperature for faster, more consistent results
+                max_output_tokens=300,  # Limit output for speed
             )
-            response_text = response.text.strip()
-            
-            # Clean the response to extract JSON
-            if "```json" in response_text:
-                response_text = response_text.split("```json")[1].split("```")[0].strip()
-            elif "```" in response_text:
-                response_text = response_text.split("```")[1].split("```")[0].strip()
-            
+        )
+        response_text = response.text.strip()
+        
+        # Clean the response to extract JSON
+        if "```json" in response_text:
+            response_text = response_text.split("```json")[1].split("```")[0].strip()
+        elif "```" in response_text:
+            response_text = response_text.split("```")[1].split("```")[0].strip()
+        
+        try:
             data = json.loads(response_text)
-            logger.info(f"AI analysis complete: {data}")
-            
-            # Normalize scores
-            emotions = data.get("emotions", [])
-            total_score = sum(e.get("score", 0) for e in emotions)
-            if total_score > 0:
-                for emotion in emotions:
-                    emotion["score"] = emotion["score"] / total_score
-            
-            # Filter emotions with score < 0.10
-            emotions = [e for e in emotions if e.get("score", 0) >= 0.10]
-            
-            if not emotions:
-                emotions = [{"label": "neutral", "score": 1.0}]
-            
-            return {
-                "refined": text,
-                "summary": data.get("summary", "You appear to be experiencing complex emotions."),
-                "emotions": emotions,
-                "intensity": min(10, max(1, data.get("intensity", 5))),
-                "dominant_emotion": data.get("dominant", emotions[0]["label"] if emotions else "neutral")
-            }
+        except json.JSONDecodeError:
+            logger.error(f"Response text: {response_text}")
+            raise
+        logger.info(f"AI analysis complete: {data}")
         
-        except json.JSONDecodeError as e:
-            logger.error(f"JSON parsing error: {e}")
-            logger.error(f"Response text: {response_text if 'response_text' in locals() else 'N/A'}")
-            return self._get_neutral_response(text)
+        # Validate the shape up front so malformed output counts as a failed call
+        emotions = []
+        for emotion in data.get("emotions", []):
+            if not isinstance(emotion, dict):
+                raise ValueError(f"Unexpected emotion entry in AI response: {emotion!r}")
+            label = emotion.get("label") or emotion.get("emotion")
+            if not label:
+                raise ValueError(f"Emotion entry without a label in AI response: {emotion!r}")
+            emotions.append({"label": str(label), "score": float(emotion.get("score", 0))})
         
-        except Exception as e:
-            logger.error(f"Error in AI emotion analysis: {str(e)}")
-            return self._get_neutral_response(text)
+        # Normalize scores
+        total_score = sum(e.get("score", 0) for e in emotions)
+        if total_score > 0:
+            for emotion in emotions:
+                emotion["score"] = emotion["score"] / total_score
+        
+        # Filter emotions with score < 0.10
+        emotions = [e for e in emotions if e.get("score", 0) >= 0.10]
+        
+        if not emotions:
+            emotions = [{"label": "neutral", "score": 1.0}]
+        
+        return {
+            "refined": text,
+            "summary": data.get("summary", "You appear to be experiencing complex emotions."),
+            "emotions": emotions,
+            "intensity": min(10, max(1, int(data.get("intensity", 5)))),
+            "dominant_emotion": data.get("dominant", emotions[0]["label"] if emotions else "neutral")
+        }
     
     def _get_neutral_response(self, text: str) -> Dict:
         """Return a neutral response when analysis fails."""
@@ -0,0 +1,144 @@
+import logging
+import math
+import os
+import random
+import re
+import threading
+from typing import Dict, List
+
+from transformers import StoppingCriteria, StoppingCriteriaList
+
+logger = logging.getLogger(__name__)
+
+SENTENCE_END = re.compile(r"[.!?](\s|$)")
+
+
+class GenerationBudget:
+    """Decoding limits for the local summary model, read from the environment."""
+
+    DECODING_MODES = ("sample", "greedy", "beam")
+
+    def __init__(self):
+        self.decoding = os.getenv("SUMMARY_DECODING", "sample").lower()
+        if self.decoding not in self.DECODING_MODES:
+            logger.warning(f"Unknown SUMMARY_DECODING '{self.decoding}', using 'sample'")
+            self.decoding = "sample"
+        self.max_time = int(os.getenv("SUMMARY_LATENCY_BUDGET_MS", "4000")) / 1000.0
+        self.max_new_tokens = {
+            "neutral": int(os.getenv("SUMMARY_MAX_NEW_TOKENS_NEUTRAL", "60")),
+            "emotional": int(os.getenv("SUMMARY_MAX_NEW_TOKENS_EMOTIONAL", "100")),
+        }
+        # Prompts ask for 2-3 sentences (neutral) and 3-4 sentences (emotional)
+        self.max_sentences = {"neutral": 3, "emotional": 4}
+
+    def generate_kwargs(self, prompt_type: str, tokenizer) -> Dict:
+        kwargs = {
+            "max_new_tokens": self.max_new_tokens[prompt_type],
+            "max_time": self.max_time,
+            "num_return_sequences": 1,
+            "stopping_criteria": StoppingCriteriaList([
+                SentenceCountStoppingCriteria(tokenizer, self.max_sentences[prompt_type])
+            ]),
+        }
+        if self.decoding == "greedy":
+            kwargs.update(do_sample=False, num_beams=1)
+        elif self.decoding == "beam":
+            kwargs.update(do_sample=False, num_beams=2, early_stopping=True)
+        else:
+            kwargs.update(do_sample=True, temperature=0.9, top_p=0.95, repetition_penalty=1.15)
+        return kwargs
+
+
+class SentenceCountStoppingCriteria(StoppingCriteria):
+    """Stops decoding once every sequence has produced max_sentences sentences."""
+
+    def __init__(self, tokenizer, max_sentences: int):
+        self.tokenizer = tokenizer
+        self.max_sentences = max_sentences
+
+    def __call__(self, input_ids, scores, **kwargs) -> bool:
+        texts = self.tokenizer.batch_decode(input_ids, skip_special_tokens=True)
+        return all(len(SENTENCE_END.findall(text)) >= self.max_sentences for text in texts)
+
+
+class GenerationSkipPredictor:
+    """
+    Online logistic regression predicting whether a generated summary will fail
+    the quality checks. When rejection is very likely we skip straight to the
+    fallback; a small share of those requests still generate so the model keeps learning.
+    """
+
+    def __init__(self, threshold: float = 0.85, min_observations: int = 30,
+                 explore_rate: float = 0.1, learning_rate: float = 0.05):
+        self.threshold = threshold
+        self.min_observations = min_observations
+        self.explore_rate = explore_rate
+        self.learning_rate = learning_rate
+        self.weights: Dict[str, float] = {}
+        self.observations = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def features(prompt_type: str, emotions: List[str], intensity: int, text: str) -> Dict[str, float]:
+        primary = emotions[0] if emotions else "neutral"
+        return {
+            "bias": 1.0,
+            f"type={prompt_type}": 1.0,
+            f"emotion={primary}": 1.0,
+            "intensity": intensity / 10.0,
+            "emotion_count": len(emotions) / 3.0,
+            "short_text": 1.0 if len(text) < 80 else 0.0,
+            "long_text": 1.0 if len(text) > 600 else 0.0,
+        }
+
+    def predict(self, features: Dict[str, float]) -> float:
+        z = sum(self.weights.get(name, 0.0) * value for name, value in features.items())
+        return 1.0 / (1.0 + math.exp(-max(-30.0, min(30.0, z))))
+
+    def should_skip(self, features: Dict[str, float]) -> bool:
+        if self.observations < self.min_observations:
+            return False
+        if self.predict(features) < self.threshold:
+            return False
+        return random.random() >= self.explore_rate
+
+    def update(self, features: Dict[str, float], rejected: bool):
+        with self._lock:
+            error = (1.0 if rejected else 0.0) - self.predict(features)
+            for name, value in features.items():
+                self.weights[name] = self.weights.get(name, 0.0) + self.learning_rate * error * value
+            self.observations += 1
+
+
+class GenerationStats:
+    """Counts summary generations, rejections, skips and the time they cost."""
+
+    def __init__(self):
+        self.generated = 0
+        self.rejected = 0
+        self.skipped = 0
+        self.generation_seconds = 0.0
+        self.wasted_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record_generation(self, seconds: float, rejected: bool):
+        with self._lock:
+            self.generated += 1
+            self.generation_seconds += seconds
+            if rejected:
+                self.rejected += 1
+                self.wasted_seconds += seconds
+
+    def record_skip(self):
+        with self._lock:
+            self.skipped += 1
+
+    def snapshot(self) -> Dict:
+        return {
+            "generated": self.generated,
+            "rejected": self.rejected,
+            "skipped": self.skipped,
+            "rejection_rate": round(self.rejected / self.generated, 3) if self.generated else 0.0,
+            "generation_seconds": round(self.generation_seconds, 2),
+            "wasted_seconds": round(self.wasted_seconds, 2),
+        }
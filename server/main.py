@@ -1,5 +1,6 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 import os
@@ -8,7 +9,13 @@ import logging
 import uvicorn
 from emotion_analyzer import EmotionAnalyzer
 from emotion_analyzer_ai import AIEmotionAnalyzer
-from chatbot_ai import MentalHealthChatbot
+from chatbot_ai import MentalHealthChatbot, resolve_session_id
+from analyzer_router import HybridAnalyzerRouter
+from user_context import UserContextStore
+from recommendations import Recommender
+from result_types import dumps
+from session_store import create_session_store
+from traffic_replay import TrafficRecorder, TrafficRecordingMiddleware, instrument_gemini_model, load_recording
 
 # Load environment variables
 load_dotenv()
@@ -36,33 +43,86 @@ app.add_middleware(
 
 # Initialize emotion analyzers
 use_ai = os.getenv("GEMINI_API_KEY") is not None and os.getenv("GEMINI_API_KEY") != ""
+use_local = os.getenv("ENABLE_LOCAL_ANALYZER", "true").lower() != "false"
 
+# Rolling per-user context, updated on every analyzed journal entry. This is
+# worker-local: unlike chat history it is not shared through the session store
+context_token_budget = int(os.getenv("CHAT_CONTEXT_TOKEN_BUDGET", "120"))
+user_contexts = UserContextStore()
+
+# Tips and exercises are served from an index built once at startup
+recommender = Recommender()
+recommender.warm()
+
+# Chat history lives outside the process so any worker can continue a conversation
+chat_session_store = create_session_store() if use_ai else None
+
+ai_analyzer = None
+chatbot = None
 if use_ai:
     try:
-        emotion_analyzer = AIEmotionAnalyzer()
-        chatbot = MentalHealthChatbot()
-        logger.info("Using AI-powered emotion analyzer (Gemini) and chatbot")
+        ai_analyzer = AIEmotionAnalyzer()
+        chatbot = MentalHealthChatbot(
+            context_token_budget=context_token_budget,
+            session_store=chat_session_store,
+            history_turns=int(os.getenv("CHAT_HISTORY_TURNS", "20"))
+        )
+        logger.info("AI-powered emotion analyzer (Gemini) and chatbot available")
     except Exception as e:
         logger.warning(f"Failed to initialize AI analyzer: {e}. Falling back to rule-based analyzer.")
-        emotion_analyzer = EmotionAnalyzer()
-        chatbot = None
         use_ai = False
-else:
-    emotion_analyzer = EmotionAnalyzer()
-    chatbot = None
-    logger.info("Using rule-based emotion analyzer")
+
+# Optional record/replay of Gemini traffic for offline performance testing
+traffic_recorder = TrafficRecorder.from_env()
+replay_path = os.getenv("GEMINI_REPLAY_PATH")
+replay_entries = load_recording(replay_path) if replay_path else None
+
+if traffic_recorder:
+    app.add_middleware(TrafficRecordingMiddleware, recorder=traffic_recorder)
+if ai_analyzer:
+    ai_analyzer.model = instrument_gemini_model(ai_analyzer.model, "analyze", traffic_recorder, replay_entries)
+if chatbot:
+    chatbot.model = instrument_gemini_model(chatbot.model, "chat", traffic_recorder, replay_entries)
+
+local_analyzer = None
+if use_local or not use_ai:
+    try:
+        local_analyzer = EmotionAnalyzer()
+        logger.info("Rule-based emotion analyzer available")
+    except Exception as e:
+        if not use_ai:
+            raise
+        logger.warning(f"Failed to initialize local analyzer: {e}. Using Gemini only.")
+
+# Route each request to whichever backend best fits its latency budget
+emotion_analyzer = HybridAnalyzerRouter(
+    ai_analyzer=ai_analyzer,
+    local_analyzer=local_analyzer,
+    default_budget_ms=int(os.getenv("ANALYZER_LATENCY_BUDGET_MS", "3000")),
+)
+
+class FastJSONResponse(JSONResponse):
+    """Renders result records directly with orjson, skipping response-model validation."""
+    
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
 
 class JournalRequest(BaseModel):
     journal: str
+    latency_budget_ms: Optional[int] = None
+    user_id: Optional[str] = None
 
 class ChatRequest(BaseModel):
     message: str
     context: Optional[Dict[str, Any]] = None
+    user_id: Optional[str] = None
+    session_id: Optional[str] = None
 
 class ChatResponse(BaseModel):
     message: str
     suggests_exercise: bool
     timestamp: Optional[str] = None
+    exercise: Optional[Dict[str, Any]] = None
 
 class EmotionResponse(BaseModel):
     refined: str
@@ -70,18 +130,25 @@ class EmotionResponse(BaseModel):
     emotions: List[Dict[str, Any]]  # Changed to accept list of dicts
     intensity: int
     dominant_emotion: str
+    wellness_suggestions: List[str] = []
+    exercises: List[Dict[str, Any]] = []
 
 @app.get("/")
 async def root():
-    analyzer_type = "AI-powered (Gemini)" if use_ai else "Rule-based"
+    if ai_analyzer and local_analyzer:
+        analyzer_type = "Hybrid (Gemini + rule-based)"
+    else:
+        analyzer_type = "AI-powered (Gemini)" if ai_analyzer else "Rule-based"
     chatbot_status = "Available" if chatbot else "Unavailable"
     return {
         "message": "Emotion Analysis API is running",
         "analyzer": analyzer_type,
-        "chatbot": chatbot_status
+        "chatbot": chatbot_status,
+        "backends": emotion_analyzer.snapshot(),
+        "summary_generation": local_analyzer.generation_stats.snapshot() if local_analyzer else None
     }
 
-@app.post("/analyze_journal", response_model=EmotionResponse)
+@app.post("/analyze_journal", response_model=EmotionResponse, response_class=FastJSONResponse)
 async def analyze_journal(request: JournalRequest):
     """
     Analyze a journal entry for emotions and provide refined text and summary.
@@ -96,9 +163,20 @@ async def analyze_journal(request: JournalRequest):
         logger.info(f"Analyzing journal entry of length: {len(request.journal)}")
         
         # Analyze the journal entry
-        result = await emotion_analyzer.analyze_journal(request.journal)
+        result = await emotion_analyzer.analyze_journal(
+            request.journal,
+            latency_budget_ms=request.latency_budget_ms
+        )
+        
+        if request.user_id:
+            user_contexts.record_analysis(request.user_id, result)
         
-        return EmotionResponse(**result)
+        recommendations = recommender.recommend_for_analysis(result)
+        result.wellness_suggestions = recommendations["tips"]
+        result.exercises = recommendations["exercises"]
+        
+        # Serialize the record directly; EmotionResponse only documents the schema
+        return FastJSONResponse(result)
     
     except Exception as e:
         logger.error(f"Error analyzing journal: {str(e)}")
@@ -109,7 +187,7 @@ async def health_check():
     """Health check endpoint"""
     return {"status": "healthy", "message": "Emotion Analysis API is operational"}
 
-@app.post("/chat", response_model=ChatResponse)
+@app.post("/chat", response_model=ChatResponse, response_class=FastJSONResponse)
 async def chat(request: ChatRequest):
     """
     Send a message to the chatbot and get a response.
@@ -130,13 +208,27 @@ async def chat(request: ChatRequest):
         
         logger.info(f"Chat request: {request.message[:50]}...")
         
+        # Prefer the server-side rolling context when we have one for this user
+        context_summary = None
+        if request.user_id:
+            context_summary = user_contexts.format_context(request.user_id, context_token_budget)
+        
         # Get chatbot response with optional context
         result = await chatbot.send_message(
             message=request.message,
-            user_context=request.context
+            user_context=request.context,
+            context_summary=context_summary,
+            session_id=resolve_session_id(request.session_id, request.user_id)
         )
         
-        return ChatResponse(**result)
+        # Attach a concrete exercise matched to the user's latest analysis
+        state = user_contexts.get(request.user_id) if request.user_id else None
+        if result.suggests_exercise and state:
+            exercises = recommender.recommend(state.last_emotion, round(state.fast_intensity))["exercises"]
+            if exercises:
+                result.exercise = exercises[0]
+        
+        return FastJSONResponse(result)
     
     except HTTPException:
         raise
@@ -145,7 +237,7 @@ async def chat(request: ChatRequest):
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 @app.post("/chat/reset")
-async def reset_chat():
+async def reset_chat(session_id: Optional[str] = None, user_id: Optional[str] = None):
     """Reset the chat conversation history"""
     try:
         if not chatbot:
@@ -154,7 +246,7 @@ async def reset_chat():
                 detail="Chatbot is not available"
             )
         
-        chatbot.reset_conversation()
+        await chatbot.reset_conversation(resolve_session_id(session_id, user_id))
         return {"message": "Chat conversation reset successfully"}
     
     except HTTPException:
@@ -164,20 +256,13 @@ async def reset_chat():
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 @app.get("/wellness-tip")
-async def get_wellness_tip():
-    """Get a random wellness tip"""
+async def get_wellness_tip(user_id: Optional[str] = None):
+    """Get a random wellness tip, matched to the user's latest emotion when known"""
     try:
-        if not chatbot:
-            raise HTTPException(
-                status_code=503,
-                detail="Chatbot is not available"
-            )
-        
-        tip = chatbot.get_wellness_tip()
+        state = user_contexts.get(user_id) if user_id else None
+        tip = recommender.wellness_tip(state.last_emotion if state else None)
         return {"tip": tip}
     
-    except HTTPException:
-        raise
     except Exception as e:
         logger.error(f"Error getting wellness tip: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
@@ -0,0 +1,123 @@
+import logging
+import random
+from typing import Dict, List, Optional, Tuple
+
+from result_types import AnalysisResult
+
+logger = logging.getLogger(__name__)
+
+# Free-form labels (mostly from Gemini) folded onto the classifier's emotion families
+EMOTION_ALIASES = {
+    "happiness": "joy", "excitement": "joy", "gratitude": "joy", "pride": "joy",
+    "hope": "calm", "contentment": "calm", "acceptance": "calm", "relief": "calm",
+    "nostalgia": "sadness", "longing": "sadness", "regret": "sadness", "grief": "sadness",
+    "loneliness": "sadness", "guilt": "sadness", "disappointment": "sadness",
+    "resentment": "anger", "frustration": "anger", "irritation": "anger",
+    "anxiety": "fear", "worry": "fear", "stress": "fear", "nervousness": "fear",
+    "affection": "love", "tenderness": "love",
+    "shock": "surprise", "confusion": "surprise",
+}
+
+EMOTION_FAMILIES = ("joy", "calm", "sadness", "anger", "fear", "love", "surprise", "disgust", "neutral")
+
+INTENSITY_BANDS = ("low", "medium", "high")
+
+# (tip, emotion families it helps with)
+WELLNESS_TIPS: Tuple[Tuple[str, Tuple[str, ...]], ...] = (
+    ("Take three deep breaths before responding to any stressful situation. This simple pause can help you respond rather than react.",
+     ("anger", "fear", "surprise", "disgust")),
+    ("Practice the 5-4-3-2-1 grounding technique: Notice 5 things you see, 4 you can touch, 3 you hear, 2 you smell, and 1 you taste.",
+     ("fear", "surprise", "anger")),
+    ("Set aside 5 minutes today for gratitude. Write down three things you're thankful for, no matter how small.",
+     ("sadness", "joy", "love", "calm", "neutral")),
+    ("Movement is medicine. Even a 10-minute walk can boost your mood and clear your mind.",
+     ("sadness", "anger", "neutral", "calm")),
+    ("Your feelings are valid, and it's okay to not be okay. Reach out to someone you trust when you need support.",
+     ("sadness", "fear", "disgust")),
+    ("Quality sleep is crucial for mental health. Try to maintain a consistent sleep schedule.",
+     ("fear", "sadness", "neutral", "calm")),
+    ("Limit social media if it's affecting your mood. Take breaks and be mindful of your screen time.",
+     ("sadness", "anger", "disgust", "neutral")),
+    ("Practice saying 'no' to protect your energy. Setting boundaries is an act of self-care.",
+     ("anger", "disgust", "fear")),
+    ("Savor the good moments. Write down what made today feel good so you can come back to it later.",
+     ("joy", "love", "calm")),
+    ("Share your happiness with someone you care about. Connection makes good feelings last longer.",
+     ("joy", "love")),
+)
+
+# Mirrors the exercise types the client knows how to render
+EXERCISES: Tuple[Dict, ...] = (
+    {"type": "breathing", "title": "Deep Breathing", "duration": "5 min",
+     "families": ("anger", "fear", "surprise", "disgust"), "bands": ("medium", "high")},
+    {"type": "gratitude", "title": "Gratitude Practice", "duration": "10 min",
+     "families": ("sadness", "joy", "love", "calm", "neutral"), "bands": ("low", "medium")},
+    {"type": "relaxation", "title": "Progressive Relaxation", "duration": "15 min",
+     "families": ("fear", "anger", "sadness"), "bands": ("medium", "high")},
+    {"type": "mindfulness", "title": "Mindful Walking", "duration": "20 min",
+     "families": ("sadness", "calm", "neutral", "joy", "love"), "bands": ("low", "medium", "high")},
+)
+
+
+def emotion_family(label: Optional[str]) -> str:
+    label = (label or "neutral").strip().lower()
+    if label in EMOTION_FAMILIES:
+        return label
+    return EMOTION_ALIASES.get(label, "neutral")
+
+
+def intensity_band(intensity: Optional[int]) -> str:
+    intensity = intensity or 5
+    if intensity >= 7:
+        return "high"
+    if intensity >= 4:
+        return "medium"
+    return "low"
+
+
+class Recommender:
+    """
+    Serves wellness tips and exercises from an index precomputed per
+    (emotion family, intensity band), so lookups never touch a model.
+    """
+
+    def __init__(self, tips_per_profile: int = 2, exercises_per_profile: int = 2):
+        self.tips_per_profile = tips_per_profile
+        self.exercises_per_profile = exercises_per_profile
+        self._tips: Dict[str, Tuple[str, ...]] = {}
+        self._index: Dict[Tuple[str, str], Dict[str, List]] = {}
+
+    def warm(self):
+        """Build the recommendation index. Called once at startup."""
+        all_tips = tuple(tip for tip, _ in WELLNESS_TIPS)
+        for family in EMOTION_FAMILIES:
+            matching = tuple(tip for tip, families in WELLNESS_TIPS if family in families)
+            self._tips[family] = matching or all_tips
+
+        for family in EMOTION_FAMILIES:
+            for band in INTENSITY_BANDS:
+                exercises = [
+                    {"type": e["type"], "title": e["title"], "duration": e["duration"]}
+                    for e in EXERCISES
+                    if family in e["families"] and band in e["bands"]
+                ]
+                self._index[(family, band)] = {
+                    "tips": list(self._tips[family][:self.tips_per_profile]),
+                    "exercises": exercises[:self.exercises_per_profile],
+                }
+        logger.info(f"Recommendation index warmed with {len(self._index)} emotion profiles")
+
+    def recommend(self, emotion: Optional[str], intensity: Optional[int] = None) -> Dict[str, List]:
+        """Precomputed tips and exercises for an emotion profile."""
+        if not self._index:
+            self.warm()
+        return self._index[(emotion_family(emotion), intensity_band(intensity))]
+
+    def recommend_for_analysis(self, result: AnalysisResult) -> Dict[str, List]:
+        return self.recommend(result.dominant_emotion, result.intensity)
+
+    def wellness_tip(self, emotion: Optional[str] = None) -> str:
+        """A random tip, drawn from the ones suited to the emotion when one is known."""
+        if not self._tips:
+            self.warm()
+        return random.choice(self._tips[emotion_family(emotion)])
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Re-drive recorded traffic against a local server and compare latency distributions.
+
+Start the candidate server with the recorded Gemini responses stubbed in:
+    GEMINI_API_KEY=replay GEMINI_REPLAY_PATH=recording.jsonl python main.py
+
+Then replay the recorded requests against it:
+    python replay_traffic.py recording.jsonl --out candidate.json
+    python replay_traffic.py recording.jsonl --out candidate.json --baseline baseline.json
+
+Without --baseline the candidate is compared with the latencies in the recording.
+"""
+
+import argparse
+import json
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import requests
+
+from traffic_replay import load_recording
+
+FILLER = "Today I felt a mix of things and wanted to write them down before bed. "
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def synthetic_body(path: str, body_bytes: int) -> bytes:
+    """A JSON body of the recorded size with filler text in place of the user's words."""
+    field = "journal" if path == "/analyze_journal" else "message"
+    envelope = json.dumps({field: ""})
+    text_length = max(10, body_bytes - len(envelope))
+    text = (FILLER * (text_length // len(FILLER) + 1))[:text_length]
+    return json.dumps({field: text}).encode("utf-8")
+
+
+def percentile(values: List[float], p: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(latencies: Dict[str, List[float]], errors: Dict[str, int]) -> Dict:
+    summary = {}
+    for path, values in latencies.items():
+        if not values:
+            continue
+        stats = {"count": len(values), "errors": errors.get(path, 0), "mean_ms": round(sum(values) / len(values), 1)}
+        for p in PERCENTILES:
+            stats[f"p{p}_ms"] = round(percentile(values, p), 1)
+        summary[path] = stats
+    return summary
+
+
+def recorded_summary(entries: List[Dict]) -> Dict:
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    for entry in entries:
+        if entry.get("type") != "request":
+            continue
+        latencies[entry["path"]].append(entry["latency_ms"])
+        if entry["status"] >= 500:
+            errors[entry["path"]] += 1
+    return summarize(latencies, errors)
+
+
+def replay(entries: List[Dict], base_url: str, speed: float, workers: int, timeout: float) -> Dict:
+    """Send the recorded requests at their original (scaled) arrival times."""
+    requests_to_send = sorted(
+        (e for e in entries if e.get("type") == "request"), key=lambda e: e["started_at"]
+    )
+    if not requests_to_send:
+        raise SystemExit("Recording contains no requests to replay")
+
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+
+    def send(entry: Dict):
+        body = synthetic_body(entry["path"], entry["body_bytes"])
+        start = time.perf_counter()
+        try:
+            response = requests.request(
+                entry["method"], base_url + entry["path"], data=body,
+                headers={"Content-Type": "application/json"}, timeout=timeout,
+            )
+            failed = response.status_code >= 500
+        except requests.RequestException:
+            failed = True
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with lock:
+            latencies[entry["path"]].append(elapsed_ms)
+            if failed:
+                errors[entry["path"]] += 1
+
+    # Arrival times are wall-clock stamps, possibly from several workers; replay relative to the first
+    first_arrival = requests_to_send[0]["started_at"]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for entry in requests_to_send:
+            due = (entry["started_at"] - first_arrival) / speed
+            delay = due - (time.perf_counter() - started)
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(send, entry)
+
+    return summarize(latencies, errors)
+
+
+def print_comparison(baseline: Dict, candidate: Dict):
+    for path in sorted(set(baseline) | set(candidate)):
+        print(path)
+        base = baseline.get(path, {})
+        cand = candidate.get(path, {})
+        for key in ("count", "errors", "mean_ms") + tuple(f"p{p}_ms" for p in PERCENTILES):
+            old, new = base.get(key), cand.get(key)
+            change = ""
+            if key.endswith("_ms") and old and new is not None:
+                change = f"{(new - old) / old * 100:+.1f}%"
+            print(f"  {key:<8} baseline {str(old):>10}   candidate {str(new):>10}   {change}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("recording", help="JSON lines file written with TRAFFIC_RECORD_PATH")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed multiplier (2.0 = twice as fast)")
+    parser.add_argument("--workers", type=int, default=32, help="Maximum concurrent requests")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-request timeout in seconds")
+    parser.add_argument("--out", help="Write the candidate latency summary to this JSON file")
+    parser.add_argument("--baseline", help="Latency summary from a previous replay to compare against")
+    args = parser.parse_args()
+
+    entries = load_recording(args.recording)
+    candidate = replay(entries, args.base_url.rstrip("/"), args.speed, args.workers, args.timeout)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(candidate, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    else:
+        baseline = recorded_summary(entries)
+    print_comparison(baseline, candidate)
+
+
+if __name__ == "__main__":
+    main()
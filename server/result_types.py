@@ -0,0 +1,76 @@
+"""
+Compact result records passed between the analyzers, the router and the API
+layer, and the serializer used to render them.
+"""
+
+import dataclasses
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is in requirements.txt
+    orjson = None
+
+
+@dataclass
+class EmotionScore:
+    __slots__ = ("label", "score")
+    label: str
+    score: float
+
+
+@dataclass
+class AnalysisResult:
+    __slots__ = (
+        "refined", "summary", "emotions", "intensity", "dominant_emotion",
+        "wellness_suggestions", "exercises",
+    )
+    refined: str
+    summary: str
+    emotions: List[EmotionScore]
+    intensity: int
+    dominant_emotion: str
+    wellness_suggestions: List[str]
+    exercises: List[Dict[str, Any]]
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "AnalysisResult":
+        """Build a record from an analyzer's raw dict output."""
+        emotions = [
+            EmotionScore(str(e.get("label", "neutral")), float(e.get("score", 0.0))) if isinstance(e, dict)
+            else EmotionScore(str(e), 0.0)
+            for e in data.get("emotions", [])
+        ]
+        return cls(
+            refined=data.get("refined", ""),
+            summary=data.get("summary", ""),
+            emotions=emotions,
+            intensity=int(data.get("intensity", 5)),
+            dominant_emotion=data.get("dominant_emotion") or "neutral",
+            wellness_suggestions=[],
+            exercises=[],
+        )
+
+
+@dataclass
+class ChatReply:
+    __slots__ = ("message", "suggests_exercise", "timestamp", "exercise")
+    message: str
+    suggests_exercise: bool
+    timestamp: Optional[str]
+    exercise: Optional[Dict[str, Any]]
+
+
+def _default(obj):
+    if dataclasses.is_dataclass(obj):
+        return {field.name: getattr(obj, field.name) for field in dataclasses.fields(obj)}
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize records straight to JSON bytes, without building intermediate dicts under orjson."""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
@@ -0,0 +1,250 @@
+"""
+Chat-session stores. Turns are appended one at a time and never rewritten,
+except by compact(), which drops all but the most recent turns of a session.
+
+Each append moves a per-session sequence number that only ever grows, so
+a worker can tell whether its cached history is still current with one cheap
+last_seq() lookup instead of reloading the conversation.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Turn = Tuple[str, str]  # (role, text), role is "user" or "model"
+
+
+class SessionStore(ABC):
+    """Interface shared by the session store backends."""
+
+    @abstractmethod
+    def append_turns(self, session_id: str, turns: List[Turn]) -> Tuple[int, int]:
+        """Append turns to a session and return its last sequence number before and after."""
+
+    @abstractmethod
+    def load_turns(self, session_id: str, limit: int) -> Tuple[int, List[Turn]]:
+        """Return the session's last sequence number and its most recent turns, oldest first."""
+
+    @abstractmethod
+    def last_seq(self, session_id: str) -> int:
+        """Return the session's last sequence number, 0 for a new session."""
+
+    @abstractmethod
+    def compact(self, session_id: str, keep_last: int):
+        """Drop all but the session's keep_last most recent turns."""
+
+    @abstractmethod
+    def delete(self, session_id: str):
+        """Remove the session's turns; its sequence number keeps growing."""
+
+
+class InMemorySessionStore(SessionStore):
+    """Process-local store; conversations are lost on restart and not shared between workers."""
+
+    def __init__(self):
+        self._turns: Dict[str, List[Turn]] = defaultdict(list)
+        self._seq: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def append_turns(self, session_id: str, turns: List[Turn]) -> Tuple[int, int]:
+        with self._lock:
+            previous = self._seq[session_id]
+            self._turns[session_id].extend(turns)
+            self._seq[session_id] += len(turns)
+            return previous, self._seq[session_id]
+
+    def load_turns(self, session_id: str, limit: int) -> Tuple[int, List[Turn]]:
+        with self._lock:
+            return self._seq.get(session_id, 0), list(self._turns.get(session_id, [])[-limit:])
+
+    def last_seq(self, session_id: str) -> int:
+        return self._seq.get(session_id, 0)
+
+    def compact(self, session_id: str, keep_last: int):
+        with self._lock:
+            if session_id in self._turns:
+                self._turns[session_id] = self._turns[session_id][-keep_last:]
+
+    def delete(self, session_id: str):
+        with self._lock:
+            # Keep the sequence number so caches of the old conversation stay invalid
+            self._turns.pop(session_id, None)
+            if session_id in self._seq:
+                self._seq[session_id] += 1
+
+
+class SQLiteSessionStore(SessionStore):
+    """SQLite-backed store, shareable by workers on the same host (WAL mode)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS chat_turns (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session_id TEXT NOT NULL,
+                    role TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )"""
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_chat_turns_session ON chat_turns (session_id, id)"
+            )
+            # Per-session sequence, kept separately so it survives delete()
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS chat_sessions (
+                    session_id TEXT PRIMARY KEY,
+                    seq INTEGER NOT NULL
+                )"""
+            )
+        logger.info(f"Chat sessions stored in SQLite database {path}")
+
+    def append_turns(self, session_id: str, turns: List[Turn]) -> Tuple[int, int]:
+        now = time.time()
+        with self._lock:
+            # IMMEDIATE takes the write lock up front so the two reads are consistent across workers
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                previous = self._seq(session_id)
+                self._conn.executemany(
+                    "INSERT INTO chat_turns (session_id, role, content, created_at) VALUES (?, ?, ?, ?)",
+                    [(session_id, role, text, now) for role, text in turns],
+                )
+                seq = previous + len(turns)
+                self._set_seq(session_id, seq)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return previous, seq
+
+    def _seq(self, session_id: str) -> int:
+        row = self._conn.execute(
+            "SELECT seq FROM chat_sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def _set_seq(self, session_id: str, seq: int):
+        self._conn.execute(
+            """INSERT INTO chat_sessions (session_id, seq) VALUES (?, ?)
+            ON CONFLICT (session_id) DO UPDATE SET seq = excluded.seq""",
+            (session_id, seq),
+        )
+
+    def load_turns(self, session_id: str, limit: int) -> Tuple[int, List[Turn]]:
+        with self._lock:
+            # One read transaction so the sequence matches the turns returned
+            self._conn.execute("BEGIN")
+            try:
+                seq = self._seq(session_id)
+                rows = self._conn.execute(
+                    "SELECT role, content FROM chat_turns WHERE session_id = ? ORDER BY id DESC LIMIT ?",
+                    (session_id, limit),
+                ).fetchall()
+            finally:
+                self._conn.execute("COMMIT")
+        return seq, [(role, content) for role, content in reversed(rows)]
+
+    def last_seq(self, session_id: str) -> int:
+        with self._lock:
+            return self._seq(session_id)
+
+    def compact(self, session_id: str, keep_last: int):
+        with self._lock:
+            self._conn.execute(
+                """DELETE FROM chat_turns WHERE session_id = ? AND id NOT IN (
+                    SELECT id FROM chat_turns WHERE session_id = ? ORDER BY id DESC LIMIT ?
+                )""",
+                (session_id, session_id, keep_last),
+            )
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM chat_turns WHERE session_id = ?", (session_id,))
+                seq = self._seq(session_id)
+                if seq:
+                    # Bump rather than drop the sequence so cached histories stay invalid
+                    self._set_seq(session_id, seq + 1)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+
+class RedisSessionStore(SessionStore):
+    """
+    Store for any Redis-protocol server (Redis, Valkey, KeyDB, ...), shareable by
+    workers on any host. Requires the optional `redis` package.
+    """
+
+    def __init__(self, url: str, prefix: str = "aroha:chat"):
+        try:
+            import redis
+        except ImportError as e:
+            raise ImportError("RedisSessionStore requires the 'redis' package (pip install redis)") from e
+
+        self._redis = redis.Redis.from_url(url)
+        self.prefix = prefix
+        logger.info(f"Chat sessions stored in Redis at {url}")
+
+    def _keys(self, session_id: str) -> Tuple[str, str]:
+        return f"{self.prefix}:{session_id}:turns", f"{self.prefix}:{session_id}:seq"
+
+    def append_turns(self, session_id: str, turns: List[Turn]) -> Tuple[int, int]:
+        turns_key, seq_key = self._keys(session_id)
+        pipe = self._redis.pipeline()
+        pipe.rpush(turns_key, *[json.dumps([role, text]) for role, text in turns])
+        pipe.incrby(seq_key, len(turns))
+        _, seq = pipe.execute()
+        return int(seq) - len(turns), int(seq)
+
+    def load_turns(self, session_id: str, limit: int) -> Tuple[int, List[Turn]]:
+        turns_key, seq_key = self._keys(session_id)
+        pipe = self._redis.pipeline()
+        pipe.get(seq_key)
+        pipe.lrange(turns_key, -limit, -1)
+        seq, raw_turns = pipe.execute()
+        return int(seq or 0), [tuple(json.loads(raw)) for raw in raw_turns]
+
+    def last_seq(self, session_id: str) -> int:
+        return int(self._redis.get(self._keys(session_id)[1]) or 0)
+
+    def compact(self, session_id: str, keep_last: int):
+        self._redis.ltrim(self._keys(session_id)[0], -keep_last, -1)
+
+    def delete(self, session_id: str):
+        turns_key, seq_key = self._keys(session_id)
+        pipe = self._redis.pipeline()
+        pipe.delete(turns_key)
+        pipe.incr(seq_key)  # invalidate cached histories of the old conversation
+        pipe.execute()
+
+
+def create_session_store(spec: Optional[str] = None) -> SessionStore:
+    """
+    Build a store from CHAT_SESSION_STORE: "memory" (default),
+    "sqlite:///path/to/chat.db", or "redis://host:6379/0".
+    """
+    spec = spec or os.getenv("CHAT_SESSION_STORE", "memory")
+    if spec == "memory":
+        return InMemorySessionStore()
+    if spec.startswith("sqlite:///"):
+        return SQLiteSessionStore(spec[len("sqlite:///"):])
+    if spec.startswith(("redis://", "rediss://", "unix://")):
+        return RedisSessionStore(spec)
+    raise ValueError(f"Unsupported CHAT_SESSION_STORE: {spec}")
@@ -0,0 +1,302 @@
+"""
+Record/replay support for offline performance testing.
+
+Recording (TRAFFIC_RECORD_PATH) appends JSON lines to a file:
+  {"type": "request", "path", "method", "status", "body_bytes", "started_at", "latency_ms"}
+  {"type": "gemini", "kind", "prompt_hash", "outcome", "response", "error", "latency_ms"}
+Request lines carry only shapes and timing, never user text; started_at is
+wall-clock time, so workers appending to one file share a timeline. Gemini lines hold
+the model's raw output, so protect the file accordingly. A Gemini call's outcome
+is "ok", "error" (only the exception type is kept) or "cancelled" (abandoned,
+e.g. because the local hedge answered first), so the slow tail and the failures
+are replayed too.
+
+Replay (GEMINI_REPLAY_PATH) swaps the Gemini models for stubs that serve the
+recorded responses at their recorded latencies; replay_traffic.py re-drives the
+recorded requests against that server.
+"""
+
+import asyncio
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+RECORDED_PATHS = ("/analyze_journal", "/chat")
+
+# Set by the middleware for requests it samples, so Gemini calls made while
+# serving other requests are not recorded either
+_sampled_request = contextvars.ContextVar("sampled_request", default=False)
+
+
+def prompt_hash(prompt) -> str:
+    return hashlib.sha256(str(prompt).encode("utf-8")).hexdigest()[:16]
+
+
+def load_recording(path: str) -> List[Dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class TrafficRecorder:
+    """Appends anonymized request shapes and Gemini responses to a JSON lines file."""
+
+    def __init__(self, path: str, sample_rate: float = 1.0):
+        self.path = path
+        self.sample_rate = sample_rate
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8", buffering=1)
+        logger.info(f"Recording traffic to {path} (sample rate {sample_rate})")
+
+    @classmethod
+    def from_env(cls) -> Optional["TrafficRecorder"]:
+        path = os.getenv("TRAFFIC_RECORD_PATH")
+        if not path:
+            return None
+        return cls(path, float(os.getenv("TRAFFIC_RECORD_SAMPLE_RATE", "1.0")))
+
+    def should_sample(self) -> bool:
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    def _write(self, entry: Dict):
+        line = json.dumps(entry, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def record_request(self, path: str, method: str, status: int, body_bytes: int, started_at: float, latency: float):
+        self._write({
+            "type": "request",
+            "path": path,
+            "method": method,
+            "status": status,
+            "body_bytes": body_bytes,
+            "started_at": round(started_at, 3),
+            "latency_ms": round(latency * 1000, 1),
+        })
+
+    def record_gemini(self, kind: str, prompt, response_text: Optional[str], latency: float,
+                      outcome: str = "ok", error: Optional[str] = None):
+        self._write({
+            "type": "gemini",
+            "kind": kind,
+            "prompt_hash": prompt_hash(prompt),
+            "outcome": outcome,
+            "response": response_text,
+            "error": error,
+            "latency_ms": round(latency * 1000, 1),
+        })
+
+    @contextmanager
+    def gemini_call(self, kind: str, prompt):
+        """
+        Time a Gemini call and record it however it ends; set call["response"] on success.
+        Calls outside a request sampled by TrafficRecordingMiddleware are not recorded.
+        """
+        call = {"response": None}
+        if not _sampled_request.get():
+            yield call
+            return
+        start = time.perf_counter()
+        outcome, error = "ok", None
+        try:
+            yield call
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            raise
+        except Exception as e:
+            outcome, error = "error", type(e).__name__
+            raise
+        finally:
+            self.record_gemini(kind, prompt, call["response"], time.perf_counter() - start, outcome, error)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class TrafficRecordingMiddleware:
+    """ASGI middleware that records the shape and latency of analysis and chat requests."""
+
+    def __init__(self, app, recorder: TrafficRecorder, paths=RECORDED_PATHS):
+        self.app = app
+        self.recorder = recorder
+        self.paths = paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths or not self.recorder.should_sample():
+            await self.app(scope, receive, send)
+            return
+
+        token = _sampled_request.set(True)
+        started_at = time.time()
+        start = time.monotonic()
+        body_bytes = 0
+        status = 500
+
+        async def counting_receive():
+            nonlocal body_bytes
+            message = await receive()
+            if message["type"] == "http.request":
+                body_bytes += len(message.get("body", b""))
+            return message
+
+        async def status_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, counting_receive, status_send)
+        finally:
+            _sampled_request.reset(token)
+            self.recorder.record_request(
+                scope["path"], scope["method"], status, body_bytes, started_at, time.monotonic() - start
+            )
+
+
+class _RecordingChatSession:
+    def __init__(self, session, recorder: TrafficRecorder, kind: str):
+        self._session = session
+        self._recorder = recorder
+        self._kind = kind
+
+    def send_message(self, content, **kwargs):
+        with self._recorder.gemini_call(self._kind, content) as call:
+            response = self._session.send_message(content, **kwargs)
+            call["response"] = response.text
+        return response
+
+    async def send_message_async(self, content, **kwargs):
+        with self._recorder.gemini_call(self._kind, content) as call:
+            response = await self._session.send_message_async(content, **kwargs)
+            call["response"] = response.text
+        return response
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+
+class RecordingGeminiModel:
+    """Wraps a genai.GenerativeModel and records every call it makes, including failed and cancelled ones."""
+
+    def __init__(self, model, recorder: TrafficRecorder, kind: str):
+        self._model = model
+        self._recorder = recorder
+        self._kind = kind
+
+    async def generate_content_async(self, contents, **kwargs):
+        with self._recorder.gemini_call(self._kind, contents) as call:
+            response = await self._model.generate_content_async(contents, **kwargs)
+            call["response"] = response.text
+        return response
+
+    def start_chat(self, **kwargs):
+        return _RecordingChatSession(self._model.start_chat(**kwargs), self._recorder, self._kind)
+
+    def __getattr__(self, name):
+        return getattr(self._model, name)
+
+
+class _ReplayResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class ReplayedGeminiError(RuntimeError):
+    """Raised by the replay stub where the recorded Gemini call failed or was abandoned."""
+
+
+def _replayed_response(recorded: Dict) -> _ReplayResponse:
+    """Turn a recorded call into its response, raising for calls that never produced one."""
+    if recorded["outcome"] == "error":
+        raise ReplayedGeminiError(f"Recorded Gemini call failed with {recorded['error']}")
+    if recorded["outcome"] == "cancelled":
+        # The real call was still running when it was abandoned, so its answer is unknown
+        raise ReplayedGeminiError(f"Recorded Gemini call was cancelled after {recorded['latency']:.3f}s")
+    return _ReplayResponse(recorded["response"])
+
+
+class _ReplayChatSession:
+    def __init__(self, model: "ReplayGeminiModel"):
+        self._model = model
+
+    def send_message(self, content, **kwargs):
+        # The real chat session call is synchronous, so block the same way
+        recorded = self._model.next_response(content)
+        time.sleep(recorded["latency"])
+        return _replayed_response(recorded)
+
+    async def send_message_async(self, content, **kwargs):
+        recorded = self._model.next_response(content)
+        await asyncio.sleep(recorded["latency"])
+        return _replayed_response(recorded)
+
+
+class ReplayGeminiModel:
+    """
+    Stands in for a genai.GenerativeModel, serving recorded responses at their
+    recorded latencies. Responses are matched by prompt hash when possible and
+    otherwise served in recorded order, since anonymized replays use filler text.
+    Recorded errors and cancellations raise ReplayedGeminiError after the
+    recorded time, so the candidate sees the same slow tail and failures.
+    """
+
+    def __init__(self, entries: List[Dict], kind: str):
+        self.kind = kind
+        self._by_hash: Dict[str, deque] = defaultdict(deque)
+        self._in_order: List[Dict] = []
+        for entry in entries:
+            if entry.get("type") != "gemini" or entry.get("kind") != kind:
+                continue
+            recorded = {
+                "outcome": entry.get("outcome", "ok"),
+                "response": entry.get("response"),
+                "error": entry.get("error"),
+                "latency": entry["latency_ms"] / 1000.0,
+            }
+            self._by_hash[entry["prompt_hash"]].append(recorded)
+            self._in_order.append(recorded)
+        self._cursor = 0
+        if self._in_order:
+            logger.info(f"Replaying {len(self._in_order)} recorded '{kind}' Gemini responses")
+        else:
+            logger.warning(f"Recording has no Gemini responses of kind '{kind}'")
+
+    def next_response(self, prompt) -> Dict:
+        if not self._in_order:
+            raise RuntimeError(f"No recorded Gemini responses of kind '{self.kind}' to replay")
+        matches = self._by_hash.get(prompt_hash(prompt))
+        if matches:
+            recorded = matches[0]
+            matches.rotate(-1)
+            return recorded
+        recorded = self._in_order[self._cursor % len(self._in_order)]
+        self._cursor += 1
+        return recorded
+
+    async def generate_content_async(self, contents, **kwargs):
+        recorded = self.next_response(contents)
+        await asyncio.sleep(recorded["latency"])
+        return _replayed_response(recorded)
+
+    def start_chat(self, **kwargs):
+        return _ReplayChatSession(self)
+
+
+def instrument_gemini_model(model, kind: str, recorder: Optional[TrafficRecorder], replay_entries: Optional[List[Dict]]):
+    """Return the model to use: a replay stub, a recording wrapper, or the model itself."""
+    if replay_entries is not None:
+        return ReplayGeminiModel(replay_entries, kind)
+    if recorder is not None:
+        return RecordingGeminiModel(model, recorder, kind)
+    return model
@@ -0,0 +1,123 @@
+import logging
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional
+
+from result_types import AnalysisResult
+
+logger = logging.getLogger(__name__)
+
+# Rough chars-per-token ratio for English prose; good enough for budgeting prompts
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def fit_to_token_budget(parts: List[str], max_tokens: int) -> str:
+    """
+    Join context parts (most important first) without exceeding max_tokens.
+    The first part that does not fit is clipped, everything after it is dropped.
+    """
+    kept = []
+    remaining = max_tokens
+    for part in parts:
+        cost = estimate_tokens(part) + 1  # +1 for the joining space
+        if cost <= remaining:
+            kept.append(part)
+            remaining -= cost
+            continue
+        max_chars = (remaining - 1) * CHARS_PER_TOKEN
+        if max_chars > 20 and part.endswith("]"):
+            kept.append(part[:max_chars - 4].rstrip() + "...]")
+        break
+    return " ".join(kept)
+
+
+class UserContextState:
+    """Compact rolling summary of a user's analyzed journal entries, updated in O(1)."""
+
+    __slots__ = (
+        "entries", "emotion_counts", "last_emotion",
+        "ewma_intensity", "fast_intensity", "recent_summaries",
+    )
+
+    def __init__(self, max_summaries: int = 3):
+        self.entries = 0
+        self.emotion_counts: Dict[str, int] = {}
+        self.last_emotion: Optional[str] = None
+        self.ewma_intensity: Optional[float] = None  # slow average, the user's baseline
+        self.fast_intensity: Optional[float] = None  # fast average, the current mood
+        self.recent_summaries = deque(maxlen=max_summaries)
+
+    def update(self, result: AnalysisResult, alpha: float = 0.2, fast_alpha: float = 0.6):
+        emotion = result.dominant_emotion
+        intensity = float(result.intensity)
+
+        self.entries += 1
+        self.emotion_counts[emotion] = self.emotion_counts.get(emotion, 0) + 1
+        self.last_emotion = emotion
+        if self.ewma_intensity is None:
+            self.ewma_intensity = intensity
+            self.fast_intensity = intensity
+        else:
+            self.ewma_intensity += alpha * (intensity - self.ewma_intensity)
+            self.fast_intensity += fast_alpha * (intensity - self.fast_intensity)
+
+        if result.summary:
+            self.recent_summaries.append(result.summary)
+
+    def mood_trend(self) -> str:
+        if self.entries < 2:
+            return "not enough entries yet"
+        delta = self.fast_intensity - self.ewma_intensity
+        if delta > 1.0:
+            direction = "intensifying"
+        elif delta < -1.0:
+            direction = "easing"
+        else:
+            direction = "steady"
+        return f"{direction}, average intensity {self.ewma_intensity:.1f}/10"
+
+    def top_emotions(self, limit: int = 3) -> List[str]:
+        ordered = sorted(self.emotion_counts.items(), key=lambda item: item[1], reverse=True)
+        return [f"{label} x{count}" for label, count in ordered[:limit]]
+
+
+class UserContextStore:
+    """In-memory per-user context states, evicting the least recently used user."""
+
+    def __init__(self, max_users: int = 10000, max_summaries: int = 3):
+        self.max_users = max_users
+        self.max_summaries = max_summaries
+        self._states: "OrderedDict[str, UserContextState]" = OrderedDict()
+
+    def record_analysis(self, user_id: str, result: AnalysisResult):
+        """Fold one analyzed journal entry into the user's rolling state."""
+        state = self._states.get(user_id)
+        if state is None:
+            state = UserContextState(self.max_summaries)
+            self._states[user_id] = state
+            if len(self._states) > self.max_users:
+                self._states.popitem(last=False)
+        else:
+            self._states.move_to_end(user_id)
+        state.update(result)
+
+    def get(self, user_id: str) -> Optional[UserContextState]:
+        return self._states.get(user_id)
+
+    def format_context(self, user_id: str, max_tokens: int) -> str:
+        """Render the user's state as chatbot context within max_tokens."""
+        state = self._states.get(user_id)
+        if state is None or state.entries == 0:
+            return ""
+
+        parts = [f"[User's recent emotion: {state.last_emotion}]"]
+        parts.append(f"[User's mood trend: {state.mood_trend()}]")
+        if state.entries > 1:
+            parts.append(f"[Frequent emotions: {', '.join(state.top_emotions())}]")
+        # Newest summary first so older ones are the first to be dropped
+        for summary in reversed(state.recent_summaries):
+            parts.append(f"[Recent journal: {summary}]")
+        return fit_to_token_budget(parts, max_tokens)